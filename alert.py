@@ -1,10 +1,79 @@
+import asyncio
+import atexit
+import threading
 import time
-import smtplib
 import ssl
+import weakref
 from email.message import EmailMessage
+import aiosmtplib
 import cv2  # OpenCV needed for frame annotation
+import numpy as np
+from overlay import Overlay
 from settings import EMAIL
 
+def _render_banner(text, origin, scale, color, thickness):
+    """Rasterize alert text once into a small overlay positioned at the text's frame location."""
+    (text_w, text_h), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+    banner = Overlay(text_h + baseline + 2 * thickness, text_w + 2 * thickness,
+                     (origin[0] - thickness, origin[1] - text_h - thickness))
+    return banner.draw(lambda img, c: cv2.putText(img, text, (thickness, text_h + thickness),
+                                                  cv2.FONT_HERSHEY_SIMPLEX, scale, c, thickness, cv2.LINE_AA),
+                       color)
+
+# Top-left red banner for capacity alerts
+CAPACITY_BANNER = _render_banner("CAPACITY EXCEEDED!", (50, 50), 1.5, (0, 0, 255), 3)
+# Orange banner positioned below the capacity alert
+RESTRICTED_BANNER = _render_banner("RESTRICTED ITEM DETECTED!", (50, 100), 1.2, (0, 165, 255), 3)
+
+_LOOP = None  # Event loop shared by every AlertManager for SMTP I/O, started on the first queued email
+_LOOP_LOCK = threading.Lock()
+_OPEN_SLOTS = set()  # Session slots currently holding a live SMTP session; only touched on _LOOP
+
+class _SessionSlot:
+    """Holds a manager's SMTP session apart from the manager, so it can still be quit after the manager is collected."""
+    __slots__ = ('smtp',)
+
+    def __init__(self):
+        self.smtp = None
+
+def _get_loop():
+    """Start the shared SMTP event loop on a daemon thread if it is not running yet."""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, daemon=True).start()
+    return _LOOP
+
+async def _quit(slot):
+    """Quit the slot's SMTP session, if any."""
+    server, slot.smtp = slot.smtp, None
+    _OPEN_SLOTS.discard(slot)
+    if server is None:
+        return
+    try:
+        await server.quit()
+    except Exception:
+        pass  # Connection already dropped by the server
+
+def _release(slot):
+    """Finalizer of a collected AlertManager: quit its session without blocking the collector."""
+    if _LOOP is not None and slot.smtp is not None:
+        asyncio.run_coroutine_threadsafe(_quit(slot), _LOOP)
+
+@atexit.register
+def _close_all():
+    """Quit every open SMTP session and stop the shared loop."""
+    if _LOOP is None:
+        return
+    async def quit_all():
+        await asyncio.gather(*(_quit(slot) for slot in list(_OPEN_SLOTS)))
+    try:
+        asyncio.run_coroutine_threadsafe(quit_all(), _LOOP).result(timeout=5)
+    except Exception:
+        pass
+    _LOOP.call_soon_threadsafe(_LOOP.stop)
+
 class AlertManager:
     def __init__(self, capacity, cooldown=10):
         """
@@ -16,9 +85,55 @@ class AlertManager:
         self.last_sent = 0
         self.alert_active = False  # For capacity alerts
         self.restricted_alert_active = False # For restricted item alerts
+        self._slot = _SessionSlot()  # Cached authenticated aiosmtplib session, reused across alerts
+        self._send_lock = asyncio.Lock()  # One SMTP transaction at a time on the shared session
+        self._pending = threading.BoundedSemaphore(32)  # Caps emails queued on the loop
+        self._consec_fail = 0  # SMTP sends that failed in a row
+        self._circuit_open_until = 0  # While in the future, emails are skipped without touching SMTP
+        self.max_consec_fail = 3  # Failures in a row before the circuit opens
+        self.circuit_backoff = 60  # Seconds the circuit stays open
+        finalizer = weakref.finalize(self, _release, self._slot)
+        finalizer.atexit = False  # _close_all quits the remaining sessions at exit
+
+    async def _connect(self):
+        """Open a new implicit-TLS SMTP session and log in once."""
+        context = ssl.create_default_context()
+        server = aiosmtplib.SMTP(hostname=EMAIL['smtp_server'], port=EMAIL['smtp_port'],
+                                 use_tls=True, tls_context=context)
+        await server.connect()
+        try:
+            await server.login(EMAIL['sender'], EMAIL['password'])
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    async def _get_server(self):
+        """
+        Return (session, reused): the cached SMTP session if it still answers NOOP,
+        otherwise a freshly connected session, which is cached.
+        """
+        server = self._slot.smtp
+        if server is not None and server.is_connected:
+            try:
+                if (await server.noop()).code == 250:
+                    return server, True
+            except (aiosmtplib.SMTPException, OSError):
+                pass
+        await _quit(self._slot)
+        self._slot.smtp = await self._connect()
+        _OPEN_SLOTS.add(self._slot)
+        return self._slot.smtp, False
 
     def send_email(self, subject, body):
+        """
+        Queue an alert email on the background SMTP event loop.
+        Returns True if the email was queued, False if skipped by the cooldown, an open circuit or a full queue.
+        """
         current_time = time.time()
+        if current_time < self._circuit_open_until:
+            print("SMTP circuit open after repeated failures: skipping email send.")
+            return False
         if current_time - self.last_sent < self.cooldown:
             print("Cooldown active: skipping email send.")
             return False  # Skip if cooldown not passed
@@ -29,25 +144,47 @@ class AlertManager:
             print(f"Warning: Email body was empty or whitespace for subject '{subject}'. Using a default body.")
             final_body = f"Alert triggered for: {subject}. (Original body was unexpectedly empty)"
 
-        self.last_sent = current_time
-
         msg = EmailMessage()
         msg['Subject'] = subject
         msg['From'] = EMAIL['sender']
         msg['To'] = EMAIL['recipient']
         msg.set_content(final_body)
 
-        context = ssl.create_default_context()
+        if not self._pending.acquire(blocking=False):
+            return False  # Too many emails already in flight; drop this alert
+        asyncio.run_coroutine_threadsafe(self._async_send(msg), _get_loop())
+        self.last_sent = current_time
+        return True
 
+    async def _async_send(self, msg):
+        """Send a single message over the cached SMTP session."""
         try:
-            with smtplib.SMTP_SSL(EMAIL['smtp_server'], EMAIL['smtp_port'], context=context) as server:
-                server.login(EMAIL['sender'], EMAIL['password'])
-                server.send_message(msg)
-            print("Alert email sent successfully.")
-            return True
+            async with self._send_lock:
+                if time.time() < self._circuit_open_until:
+                    return False  # Circuit opened while this email was waiting; don't wait on SMTP again
+                server, reused = await self._get_server()
+                try:
+                    await server.send_message(msg)
+                except (aiosmtplib.SMTPException, OSError):
+                    if not reused:
+                        raise  # A brand-new session failed; retrying would just wait out another timeout
+                    # Cached session died between NOOP and send; reconnect once and retry
+                    await _quit(self._slot)
+                    server, _ = await self._get_server()
+                    await server.send_message(msg)
+                print("Alert email sent successfully.")
+                self._consec_fail = 0
+                self._circuit_open_until = 0
+                return True
         except Exception as e:
+            await _quit(self._slot)
             print(f"Failed to send alert email: {e}")
+            self._consec_fail += 1
+            if self._consec_fail >= self.max_consec_fail:
+                self._circuit_open_until = time.time() + self.circuit_backoff
             return False
+        finally:
+            self._pending.release()
 
     def check_capacity(self, current_count):
         if current_count > self.capacity:
@@ -72,31 +209,28 @@ class AlertManager:
         alert_triggered = self.check_capacity(current_count)
         if alert_triggered:
             # Put red alert text on frame at top-left corner
-            cv2.putText(frame, "CAPACITY EXCEEDED!", (50, 50),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 255), 3, cv2.LINE_AA)
+            CAPACITY_BANNER.blit(frame)
         return alert_triggered
 
-    def handle_restricted(self, frame, detections, restricted_items_lower):
+    def handle_restricted(self, frame, cls_ids, restricted_ids, names):
         """
         Check for restricted items and send alert if needed.
         Annotate the frame with warning text if restricted items are detected.
-        `restricted_items_lower` should be a list of lowercase item names.
+        `cls_ids` is the int array of class ids for the frame's detections,
+        `restricted_ids` an int array of the restricted class ids and
+        `names` the model's class-id -> label mapping.
         Returns True if a restricted item is detected, else False.
         """
-        found_restricted_labels_in_frame = []
-        is_restricted_item_present_this_frame = False
-
-        for *_, label_detected_original in detections: # Detections are (x1,y1,x2,y2, label)
-            label_detected_lower = label_detected_original.lower()
-            if label_detected_lower in restricted_items_lower:
-                is_restricted_item_present_this_frame = True
-                if label_detected_original not in found_restricted_labels_in_frame:
-                    found_restricted_labels_in_frame.append(label_detected_original)
-        
+        restricted_hits = np.isin(cls_ids, restricted_ids)
+        is_restricted_item_present_this_frame = bool(restricted_hits.any())
+
         if is_restricted_item_present_this_frame:
             if not self.restricted_alert_active:
                 subject = "Restricted Item Alert"
                 
+                # Labels are only resolved when an email is actually due
+                found_restricted_labels_in_frame = [names[i] for i in dict.fromkeys(cls_ids[restricted_hits].tolist())]
+
                 # Construct the detailed part of the body
                 if found_restricted_labels_in_frame:
                     details = f"The following restricted item(s) were detected: {', '.join(found_restricted_labels_in_frame)}."
@@ -112,8 +246,7 @@ class AlertManager:
                     self.restricted_alert_active = True
             
             # Annotate frame if a restricted item is present in this frame
-            cv2.putText(frame, "RESTRICTED ITEM DETECTED!", (50, 100), # Positioned below capacity alert
-                        cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 165, 255), 3, cv2.LINE_AA) # Orange color
+            RESTRICTED_BANNER.blit(frame)
             return True # Indicates a restricted item condition is active (based on current frame)
         else:
             # Reset restricted alert email status if no restricted items are currently detected
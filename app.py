@@ -1,13 +1,52 @@
 import streamlit as st
 import cv2
+import numpy as np
+import torch
 from helper import list_models, load_model   # Your helper.py functions
 from tracker import PeopleTracker            # Your tracker.py class
 from auth import login                        # Your auth.py function
 from alert import AlertManager                # Your alert.py class
+from capture import FrameGrabber              # Your capture.py class
 import time
+from pathlib import Path
 
 st.set_page_config(page_title='People Counter', layout='wide')
 
+# Flashing alert markup, built once for each message the loop can show
+FLASH_HTML = {
+    msg: f"<h3 style='color: red; text-align: center; font-weight: bold;'>🚨 {msg} 🚨</h3>"
+    for msg in ("CAPACITY EXCEEDED!", "UNAUTHORIZED ITEM DETECTED!")
+}
+
+# Do the BGR->RGB display conversion on the GPU when OpenCV was built with CUDA
+USE_CUDA_CV = hasattr(cv2, 'cuda') and cv2.cuda.getCudaEnabledDeviceCount() > 0
+
+def run_detector(detector, frames, imgsz, batch):
+    """
+    Runs YOLO on a list of frames and returns one result per frame. Frames go through as one
+    batch only when `batch` is set, since static-shape exports accept a single frame per call.
+    """
+    if batch:
+        return detector(frames, imgsz=imgsz, verbose=False)
+    return [detector(frame, imgsz=imgsz, verbose=False)[0] for frame in frames]
+
+def extract_detections(results, names_arr, person_id, with_others=False):
+    """
+    Copies one YOLO result to the host, filtering on the device first so only person boxes
+    (plus the small class-id vector) cross to the CPU.
+    Returns (person_boxes, cls_ids, other_boxes, other_labels); the last two are None
+    unless `with_others` is set.
+    """
+    cls = results.boxes.cls
+    is_person = cls == person_id
+    person_boxes = results.boxes.xyxy[is_person].to(torch.int32).cpu().numpy()
+    cls_ids = cls.to(torch.int32).cpu().numpy()
+    other_boxes = other_labels = None
+    if with_others:
+        other_boxes = results.boxes.xyxy[~is_person].to(torch.int32).cpu().numpy()
+        other_labels = names_arr[cls_ids[cls_ids != person_id]]
+    return person_boxes, cls_ids, other_boxes, other_labels
+
 def main():
     # User authentication
     if not login():
@@ -21,11 +60,20 @@ def main():
     mode = st.sidebar.radio('Mode', ['Eagle‑Eye', 'Lane Counter'])
     capacity = st.sidebar.number_input('Max capacity', min_value=1, value=10)
     restricted_input = st.sidebar.text_input('Restricted classes (comma separated)', '')
-    restricted_items = [x.strip().lower() for x in restricted_input.split(',') if x.strip()]
+    st.sidebar.select_slider('Inference size (px)', options=[320, 416, 480, 640, 800, 960, 1280],
+                             value=640, key='imgsz')
+    detect_every = st.sidebar.slider('Run detection every Nth frame', min_value=1, max_value=5, value=2)
+    restricted_items = frozenset(x.strip().lower() for x in restricted_input.split(',') if x.strip())
 
-    # Initialize tracker and reset counts if mode changed
-    if 'tracker' not in st.session_state or st.session_state.get('tracker_mode') != mode:
+    # One tracker per browser session, created once and reused across reruns and mode changes
+    if 'tracker' not in st.session_state:
         st.session_state['tracker'] = PeopleTracker(mode=mode)
+    tracker = st.session_state['tracker']
+
+    # Reset counts if mode changed
+    if st.session_state.get('tracker_mode') != mode:
+        tracker.reset_counts()
+        tracker.mode = mode
         st.session_state['tracker_mode'] = mode
         st.session_state['in_count'] = 0
         st.session_state['out_count'] = 0
@@ -33,21 +81,34 @@ def main():
 
     # Reset counts button for lane counter mode
     if mode == 'Lane Counter' and st.sidebar.button('Reset lane counts'):
-        st.session_state['tracker'].reset_counts()
+        tracker.reset_counts()
         st.session_state['in_count'] = 0
         st.session_state['out_count'] = 0
         st.session_state['people_total'] = 0
 
-    # Load model if changed or not loaded
-    if ('detector' not in st.session_state or 
-        st.session_state.get('model_name') != selected_model):
-        detector, names = load_model(selected_model)
-        st.session_state['detector'] = detector
-        st.session_state['names'] = names
+    # load_model is cached per model name, so this only touches disk the first time
+    detector, names = load_model(selected_model)
+    # .pt weights (and their dynamic INT8 export) take batches; user-supplied .onnx files may be static
+    batch_frames = Path(selected_model).suffix.lower() == '.pt'
+    if st.session_state.get('model_name') != selected_model:
+        # Class-id -> label lookup table so labels can be gathered in one NumPy indexing op
+        st.session_state['names_arr'] = np.array([names[i] for i in range(len(names))])
+        st.session_state['person_id'] = next((i for i, n in names.items() if n == 'person'), -1)
         st.session_state['model_name'] = selected_model
+        st.session_state.pop('last_detections', None)
 
-    # Initialize AlertManager with cooldown
-    alert_mgr = AlertManager(capacity=capacity, cooldown=10)
+    # Resolve restricted names to class ids once per model / restricted-list change
+    if st.session_state.get('restricted_key') != (selected_model, restricted_items):
+        st.session_state['restricted_ids'] = np.fromiter(
+            (i for i, n in names.items() if n.lower() in restricted_items), np.int32)
+        st.session_state['restricted_key'] = (selected_model, restricted_items)
+    restricted_ids = st.session_state['restricted_ids']
+
+    # AlertManager is kept per session across reruns so its cooldown and SMTP session persist
+    if 'alert_mgr' not in st.session_state:
+        st.session_state['alert_mgr'] = AlertManager(capacity=capacity, cooldown=10)
+    alert_mgr = st.session_state['alert_mgr']
+    alert_mgr.capacity = capacity
 
     # Initialize alert flashing state variables
     st.session_state.setdefault('custom_alert_message', "")
@@ -72,6 +133,11 @@ def main():
             st.session_state['custom_alert_message'] = ""
             alert_placeholder.empty()
 
+    # A rerun interrupts the frame loop, so stop the previous run's capture thread here
+    if st.session_state.get('grabber') is not None:
+        st.session_state['grabber'].stop()
+        st.session_state['grabber'] = None
+
     if st.session_state['run_stream']:
         try:
             cam_idx = int(cam_source) if cam_source.isdigit() else cam_source
@@ -82,76 +148,100 @@ def main():
             cap = None
 
         if cap and cap.isOpened():
-            st.session_state['tracker'].mode = mode
-
-            while cap.isOpened() and st.session_state['run_stream']:
-                ret, frame = cap.read()
-                if not ret:
-                    st.error("Failed to read from camera.")
-                    st.session_state['run_stream'] = False
-                    break
-
-                if 'detector' not in st.session_state or 'names' not in st.session_state:
-                    st.warning("Detection model not loaded.")
-                    time.sleep(1)
-                    continue
-
-                # Run detector on frame
-                results = st.session_state['detector'](frame, verbose=False)[0]
-
-                detections = []
-                for box, cls in zip(results.boxes.xyxy.cpu().numpy(), results.boxes.cls.cpu().numpy()):
-                    x1, y1, x2, y2 = box.astype(int)
-                    label = st.session_state['names'][int(cls)]
-                    detections.append((x1, y1, x2, y2, label))
-
-                # Update tracker with detections
-                in_c, out_c, total_c, frame = st.session_state['tracker'].update(detections, frame)
-
-                st.session_state['in_count'] = in_c
-                st.session_state['out_count'] = out_c
-                st.session_state['people_total'] = total_c
-
-                # Handle alerts (frame annotated internally)
-                alert_mgr.handle_capacity(frame, total_c)
-                if restricted_items:
-                    alert_mgr.handle_restricted(frame, detections, restricted_items)
-
-                # Determine alert message to flash below feed
-                alert_msg = ""
-                if total_c > capacity:
-                    alert_msg = "CAPACITY EXCEEDED!"
-                elif restricted_items and any(label.lower() in restricted_items for *_, label in detections):
-                    alert_msg = "UNAUTHORIZED ITEM DETECTED!"
-
-                st.session_state['custom_alert_message'] = alert_msg
-
-                # Flashing alert toggle every 0.7 sec
-                now = time.time()
-                if now - st.session_state['last_flash_toggle_time'] > 0.7:
-                    st.session_state['custom_alert_visible'] = not st.session_state['custom_alert_visible']
-                    st.session_state['last_flash_toggle_time'] = now
-
-                if st.session_state['custom_alert_message'] and st.session_state['custom_alert_visible']:
-                    alert_placeholder.markdown(
-                        f"<h3 style='color: red; text-align: center; font-weight: bold;'>🚨 {st.session_state['custom_alert_message']} 🚨</h3>",
-                        unsafe_allow_html=True)
-                else:
-                    alert_placeholder.empty()
-
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                video_placeholder.image(frame_rgb, channels='RGB', use_container_width=True)
-
-                with metrics_placeholder.container():
-                    st.metric("People in view (Net)", total_c)
-                    if mode == 'Lane Counter':
-                        st.metric("Entries", in_c)
-                        st.metric("Exits", out_c)
-
-                time.sleep(0.01)
-
-            if cap:
-                cap.release()
+            tracker.mode = mode
+            gpu_frame = cv2.cuda_GpuMat() if USE_CUDA_CV else None # Reused device buffer
+            grabber = FrameGrabber(cap) # Reads the camera on its own thread, buffering a few frames
+            st.session_state['grabber'] = grabber
+            # Detections from a previous stream must not be drawn on this one
+            st.session_state['frame_counter'] = 0
+            st.session_state.pop('last_detections', None)
+
+            # Stop the capture thread even if the session ends mid-loop (StopException on tab close)
+            try:
+                while st.session_state['run_stream']:
+                    ret, frames = grabber.read_batch()
+                    if not ret:
+                        st.error("Failed to read from camera.")
+                        st.session_state['run_stream'] = False
+                        break
+
+                    # Run detector only on every Nth captured frame, counting frames that queued up
+                    # while the last iteration ran; otherwise reuse the last detections and let the
+                    # tracker's nearest-centroid matching bridge the gap
+                    frame_counter = st.session_state.get('frame_counter', 0)
+                    st.session_state['frame_counter'] = frame_counter + len(frames)
+                    frame = frames[-1] # Only the newest frame is displayed
+                    detect_idx = [i for i in range(len(frames)) if (frame_counter + i) % detect_every == 0]
+                    if 'last_detections' not in st.session_state and len(frames) - 1 not in detect_idx:
+                        detect_idx.append(len(frames) - 1)
+                    if detect_idx:
+                        results = run_detector(detector, [frames[i] for i in detect_idx],
+                                               st.session_state.get('imgsz', 640), batch_frames)
+                        for i, frame_results in zip(detect_idx, results):
+                            # Non-person boxes are only needed to draw them in Eagle-Eye mode
+                            detections = extract_detections(
+                                frame_results, st.session_state['names_arr'], st.session_state['person_id'],
+                                with_others=(i == detect_idx[-1] and mode == 'Eagle‑Eye'))
+                            if i < len(frames) - 1:
+                                # Older frames only advance the tracker, so crossings in them are still counted
+                                tracker.update(detections[0], frames[i], draw=False)
+                            st.session_state['last_detections'] = detections
+                    person_boxes, cls_ids, other_boxes, other_labels = st.session_state['last_detections']
+
+                    # Update tracker with detections
+                    in_c, out_c, total_c, frame = tracker.update(person_boxes, frame,
+                                                                 other_boxes=other_boxes, other_labels=other_labels)
+
+                    st.session_state['in_count'] = in_c
+                    st.session_state['out_count'] = out_c
+                    st.session_state['people_total'] = total_c
+
+                    # Handle alerts (frame annotated internally)
+                    alert_mgr.handle_capacity(frame, total_c)
+                    restricted_present = False
+                    if restricted_ids.size:
+                        restricted_present = alert_mgr.handle_restricted(
+                            frame, cls_ids, restricted_ids, names)
+
+                    # Determine alert message to flash below feed
+                    alert_msg = ""
+                    if total_c > capacity:
+                        alert_msg = "CAPACITY EXCEEDED!"
+                    elif restricted_present:
+                        alert_msg = "UNAUTHORIZED ITEM DETECTED!"
+
+                    st.session_state['custom_alert_message'] = alert_msg
+
+                    # Flashing alert toggle every 0.7 sec
+                    now = time.time()
+                    if now - st.session_state['last_flash_toggle_time'] > 0.7:
+                        st.session_state['custom_alert_visible'] = not st.session_state['custom_alert_visible']
+                        st.session_state['last_flash_toggle_time'] = now
+
+                    if st.session_state['custom_alert_message'] and st.session_state['custom_alert_visible']:
+                        alert_placeholder.markdown(FLASH_HTML[st.session_state['custom_alert_message']],
+                                                   unsafe_allow_html=True)
+                    else:
+                        alert_placeholder.empty()
+
+                    if gpu_frame is not None:
+                        gpu_frame.upload(frame)
+                        frame_rgb = cv2.cuda.cvtColor(gpu_frame, cv2.COLOR_BGR2RGB).download()
+                    else:
+                        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    video_placeholder.image(frame_rgb, channels='RGB', use_container_width=True)
+
+                    with metrics_placeholder.container():
+                        st.metric("People in view (Net)", total_c)
+                        if mode == 'Lane Counter':
+                            st.metric("Entries", in_c)
+                            st.metric("Exits", out_c)
+
+                    time.sleep(0.01)
+            finally:
+                grabber.stop()
+                st.session_state['grabber'] = None
+
             video_placeholder.empty()
             alert_placeholder.empty()
             metrics_placeholder.empty()
@@ -1,5 +1,6 @@
 import streamlit as st
 import hashlib
+import hmac
 from settings import USERS
 
 def login():
@@ -9,7 +10,8 @@ def login():
     user = st.sidebar.text_input('Username')
     pwd = st.sidebar.text_input('Password', type='password')
     if st.sidebar.button('Login'):
-        if user in USERS and USERS[user] == hashlib.sha256(pwd.encode()).hexdigest():
+        stored = USERS.get(user)
+        if stored is not None and hmac.compare_digest(stored, hashlib.sha256(pwd.encode()).hexdigest()):
             st.session_state['authenticated'] = True
             st.sidebar.success('Logged in!')
             return True
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import deque
+
+class FrameGrabber:
+    """
+    Reads frames from a cv2.VideoCapture on a background thread into a small ring buffer.
+    When the buffer is full the oldest frame is overwritten, so the consumer never works
+    through a stale backlog; whatever has accumulated is handed over as one batch.
+    """
+    def __init__(self, cap, batch_size=4):
+        """
+        Starts the producer thread.
+        Args:
+            cap (cv2.VideoCapture): An opened capture. It is released by the producer thread on stop.
+            batch_size (int): Maximum number of unread frames kept for the next batch.
+        """
+        self.cap = cap
+        self._slot = deque(maxlen=batch_size) # Unread frames, oldest first; append() evicts the oldest
+        self._new_frame = threading.Event()
+        self._released = threading.Event() # Set once the producer thread has released the capture
+        self._got_frame = False # Whether any frame has been handed to the consumer yet
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while self._running:
+                ok, frame = self.cap.read()
+                if not ok:
+                    break
+                self._slot.append(frame)
+                self._new_frame.set()
+        finally:
+            self.cap.release()
+            self._released.set()
+            self._new_frame.set() # Wake a waiting consumer so it sees the thread has ended
+
+    def read_batch(self, timeout=5.0, first_timeout=30.0):
+        """
+        Waits for at least one unread frame and takes every buffered frame.
+        The first call waits up to first_timeout, since network streams can take a while to deliver a frame.
+        Returns (True, frames) with frames oldest first, or (False, []) if the camera stopped or timed out.
+        """
+        deadline = time.monotonic() + (timeout if self._got_frame else first_timeout)
+        while True:
+            frames = []
+            try:
+                while True:
+                    frames.append(self._slot.popleft())
+            except IndexError:
+                pass
+            if frames:
+                self._got_frame = True
+                return True, frames
+            remaining = deadline - time.monotonic()
+            if not self._thread.is_alive() or remaining <= 0:
+                return False, []
+            self._new_frame.wait(remaining)
+            self._new_frame.clear()
+
+    def stop(self, timeout=None):
+        """
+        Stops the producer thread and waits until it has released the capture,
+        so the same device can be reopened straight away.
+        The thread only notices the request once its current read() returns.
+        Returns True if the capture was released within timeout (None waits indefinitely).
+        """
+        self._running = False
+        return self._released.wait(timeout)
@@ -1,5 +1,9 @@
 import os
+import shutil
 from pathlib import Path
+import numpy as np
+import streamlit as st
+import torch
 from ultralytics import YOLO
 
 MODEL_DIR = Path(__file__).parent / 'models'
@@ -10,8 +14,50 @@ def list_models():
     models = [f.name for f in MODEL_DIR.iterdir() if f.suffix.lower() in EXTS]
     return models or ['yolov8n.pt']   # fallback to built‑in
 
-def load_model(model_name):
+def _int8_model(path, model_name):
+    """
+    Returns the INT8 OpenVINO export of a .pt model, exporting it into MODEL_DIR on first use.
+    The export has dynamic input shapes so batched calls and any inference size work.
+    Returns None if the export fails, so the caller can fall back to the .pt weights.
+    """
+    target = MODEL_DIR / f'{Path(model_name).stem}_int8_dynamic_openvino_model'
+    if not target.exists():
+        # Built under a temporary name and renamed when complete, so an interrupted export is never picked up
+        partial = target.with_name(target.name + '.partial')
+        shutil.rmtree(partial, ignore_errors=True)
+        try:
+            exported = YOLO(path).export(format='openvino', int8=True, dynamic=True, imgsz=640)
+            shutil.move(str(exported), str(partial))
+            os.replace(partial, target)
+        except Exception as e:
+            shutil.rmtree(partial, ignore_errors=True)
+            print(f"INT8 export of {model_name} failed, using FP32 weights: {e}")
+            return None
+    return str(target)
+
+@st.cache_resource(show_spinner="Loading detector…")
+def load_model(model_name, auto_quantize=True):
+    # Cached per model_name for the whole process, so weights are read and moved to the device once
     local = MODEL_DIR / model_name
     path = str(local) if local.exists() else model_name
+    # CPU-only hosts run an INT8 OpenVINO export of .pt weights instead of the FP32 PyTorch model
+    if auto_quantize and Path(path).suffix.lower() == '.pt' and not torch.cuda.is_available():
+        int8_path = _int8_model(path, model_name)
+        if int8_path is not None:
+            try:
+                model = YOLO(int8_path, task='detect')
+                model(np.zeros((640, 640, 3), np.uint8), verbose=False) # The backend only loads on first inference
+                return model, model.names
+            except Exception as e:
+                # Unreadable export (e.g. from an older, interrupted run): drop it so the next load re-exports
+                print(f"Loading INT8 model {int8_path} failed, using FP32 weights: {e}")
+                shutil.rmtree(int8_path, ignore_errors=True)
     model = YOLO(path)
+    if Path(path).suffix.lower() == '.pt':   # exported formats are not PyTorch modules
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        model.to(device)
+        model.fuse()   # fold Conv+BN for faster inference
+        model.overrides['device'] = device
+        if device == 'cuda':
+            model.overrides['half'] = True   # FP16 inference; applied by the predictor on every call
     return model, model.names
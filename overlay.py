@@ -0,0 +1,50 @@
+import numpy as np
+
+class Overlay:
+    """
+    Static annotations rasterized once and alpha-blended onto every frame.
+    Each element is drawn as a single-channel coverage mask, so anti-aliased edges
+    blend with the frame the same way as drawing directly on it would.
+    """
+    def __init__(self, h, w, top_left=(0, 0)):
+        """
+        Creates an empty overlay.
+        Args:
+            h, w (int): Size of the overlay in pixels.
+            top_left (tuple): Frame position (x, y) of the overlay's top-left corner.
+        """
+        self.top_left = top_left
+        self._color = np.zeros((h, w, 3), np.float32) # Composited colour, premultiplied by alpha
+        self._alpha = np.zeros((h, w), np.float32)
+        self._pixels = None # (ys, xs, color, 1 - alpha) of covered pixels, built on first blit
+        self._clipped = None # _pixels clipped to the last frame shape
+        self._clip_shape = None
+
+    def draw(self, draw_fn, color):
+        """
+        Adds one element on top of those already drawn.
+        `draw_fn(canvas, 255)` must draw the element onto the single-channel canvas it is given.
+        """
+        coverage = np.zeros(self._alpha.shape, np.uint8)
+        draw_fn(coverage, 255)
+        a = coverage.astype(np.float32) / 255
+        self._color = self._color * (1 - a)[..., None] + np.asarray(color, np.float32) * a[..., None]
+        self._alpha = self._alpha * (1 - a) + a
+        self._pixels = None
+        return self
+
+    def blit(self, frame):
+        """Blends the overlay onto the frame in place, clipped to the frame bounds."""
+        if self._pixels is None:
+            ys, xs = np.nonzero(self._alpha)
+            self._pixels = (ys + self.top_left[1], xs + self.top_left[0],
+                            self._color[ys, xs], (1 - self._alpha[ys, xs])[:, None])
+            self._clip_shape = None
+        if self._clip_shape != frame.shape[:2]:
+            ys, xs, color, keep = self._pixels
+            h, w = frame.shape[:2]
+            inside = (ys >= 0) & (ys < h) & (xs >= 0) & (xs < w)
+            self._clipped = (ys[inside], xs[inside], color[inside], keep[inside])
+            self._clip_shape = frame.shape[:2]
+        ys, xs, color, keep = self._clipped
+        frame[ys, xs] = (frame[ys, xs] * keep + color + 0.5).astype(np.uint8)
@@ -1,6 +1,64 @@
 import cv2
 import math
 import time
+import numpy as np
+from numba import njit
+from scipy.optimize import linear_sum_assignment
+from overlay import Overlay
+
+# Bits of PeopleTracker.track_flags
+IN_BIT = 1   # Track has been counted as an entry
+OUT_BIT = 2  # Track has been counted as an exit
+LANE_BIT = 4 # Track is in the exit lane (clear means enter lane)
+
+UNMATCHABLE = 1e12 # Assignment cost for track/detection pairs farther apart than max_dist_sq
+
+@njit(cache=True)
+def match_costs(track_centroids, det_centroids, rows, cols, max_dist, max_dist_sq):
+    """
+    Builds the (N, M) track/detection assignment cost matrix of squared centroid distances,
+    evaluating only the candidate pairs (rows[k], cols[k]).
+    Pairs whose |dx| or |dy| alone exceeds `max_dist` are rejected before any multiply;
+    every pair not evaluated or at/beyond `max_dist_sq` costs UNMATCHABLE.
+    """
+    cost = np.full((track_centroids.shape[0], det_centroids.shape[0]), UNMATCHABLE)
+    for k in range(rows.shape[0]):
+        i = rows[k]
+        j = cols[k]
+        dx = det_centroids[j, 0] - track_centroids[i, 0]
+        if abs(dx) > max_dist:
+            continue
+        dy = det_centroids[j, 1] - track_centroids[i, 1]
+        if abs(dy) > max_dist:
+            continue
+        dist_sq = dx * dx + dy * dy
+        if dist_sq < max_dist_sq:
+            cost[i, j] = dist_sq
+    return cost
+
+@njit(cache=True)
+def process_tracks(bbox, centroids, flags, lane_split_x, entry_y, exit_y):
+    """
+    Assigns each track to a lane and counts threshold crossings, updating `flags` in place.
+    Returns the number of new entries and exits.
+    """
+    in_delta = 0
+    out_delta = 0
+    for i in range(bbox.shape[0]):
+        # Determine lane for drawing and counting
+        if centroids[i, 0] < lane_split_x:
+            flags[i] &= ~LANE_BIT
+            # Entry Logic: Person in enter lane, bottom crosses entry threshold, not yet counted in
+            if bbox[i, 3] > entry_y and (flags[i] & IN_BIT) == 0:
+                in_delta += 1
+                flags[i] |= IN_BIT
+        else:
+            flags[i] |= LANE_BIT
+            # Exit Logic: Person in exit lane, top crosses exit threshold, not yet counted out
+            if bbox[i, 1] < exit_y and (flags[i] & OUT_BIT) == 0:
+                out_delta += 1
+                flags[i] |= OUT_BIT
+    return in_delta, out_delta
 
 class PeopleTracker:
     """
@@ -17,9 +75,12 @@ class PeopleTracker:
         self.lane_split_x = None # X-coordinate for the lane splitting line
         self.entry_y_threshold = None # Y-coordinate for the entry line (bottom of frame)
         self.exit_y_threshold = None  # Y-coordinate for the exit line (top of frame)
+        self._static_overlay = None # Pre-rendered lane/threshold lines, built on the first Lane Counter frame
+        self._static_shape = None # Frame (h, w) _static_overlay was rendered for
 
-        # Tracking variables for Lane Counter mode
-        self.tracked_objects = {} # Stores active tracked persons: {id: {'bbox': ..., 'centroid': ..., 'lane': 'enter'/'exit', 'counted_in': False, 'counted_out': False, 'last_frame_id': ...}}
+        # Tracking variables for Lane Counter mode, stored as parallel arrays (one row per track).
+        # Only the first `num_tracks` rows are live; capacity doubles when it runs out.
+        self._alloc(16)
         self.next_id = 0 # Counter for assigning unique IDs to new tracks
         self.in_count = 0 # Total count of people who entered
         self.out_count = 0 # Total count of people who exited
@@ -27,32 +88,99 @@ class PeopleTracker:
 
         # Configuration for tracking (adjust as needed)
         self.max_dist_sq = 5000 # Maximum squared distance for centroid matching (pixels)
+        self.max_dist = math.isqrt(self.max_dist_sq) # Per-axis bound used to skip far pairs early; also the grid cell size
+        self._grid = {} # Spatial hash of track indices by (cx, cy) // max_dist, rebuilt every frame
         self.stale_frame_threshold = 30 # How many frames before a track is considered stale and removed
+        self.max_tracks = 512 # Upper bound on live tracks; the least recently seen are evicted first
+
+    def _alloc(self, capacity):
+        """Allocates empty track arrays with room for `capacity` tracks."""
+        self.num_tracks = 0
+        self.track_ids = np.zeros(capacity, np.int64) # Unique ID of each track
+        self.track_bbox = np.zeros((capacity, 4), np.int32) # (x1, y1, x2, y2)
+        self.track_centroids = np.zeros((capacity, 2), np.int32) # (cx, cy)
+        self.track_last_frame = np.zeros(capacity, np.int64) # Frame the track was last matched in
+        self.track_flags = np.zeros(capacity, np.uint8) # Bitmask of IN_BIT / OUT_BIT / LANE_BIT
 
-    def _get_centroid(self, bbox):
-        """Calculates the centroid of a bounding box."""
-        x1, y1, x2, y2 = bbox
-        return ((x1 + x2) // 2, (y1 + y2) // 2)
+    def _grow(self, needed):
+        """Doubles the track arrays until at least `needed` tracks fit."""
+        capacity = len(self.track_ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ('track_ids', 'track_bbox', 'track_centroids', 'track_last_frame', 'track_flags'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], old.dtype)
+            new[:self.num_tracks] = old[:self.num_tracks]
+            setattr(self, name, new)
 
-    def _distance_sq(self, p1, p2):
-        """Calculates the squared Euclidean distance between two points."""
-        return (p1[0] - p2[0])**2 + (p1[1] - p2[1])**2
+    def _candidate_pairs(self, det_centroids):
+        """
+        Buckets the live tracks into a grid of `max_dist`-sized cells and returns the
+        (track_index, detection_index) arrays of pairs that share or neighbour a cell.
+        Any pair within `max_dist` on both axes is guaranteed to be among them.
+        """
+        cell_size = max(self.max_dist, 1)
+        self._grid = {}
+        for i, cell in enumerate((self.track_centroids[:self.num_tracks] // cell_size).tolist()):
+            self._grid.setdefault(tuple(cell), []).append(i)
+
+        rows, cols = [], []
+        for j, (gx, gy) in enumerate((det_centroids // cell_size).tolist()):
+            for nx in (gx - 1, gx, gx + 1):
+                for ny in (gy - 1, gy, gy + 1):
+                    for i in self._grid.get((nx, ny), ()):
+                        rows.append(i)
+                        cols.append(j)
+        return np.array(rows, np.intp), np.array(cols, np.intp)
+
+    def _compact(self, keep):
+        """Keeps only the live tracks where `keep` is True, preserving order. Returns the new track count."""
+        kept = int(np.count_nonzero(keep))
+        if kept < self.num_tracks:
+            n = self.num_tracks
+            for arr in (self.track_ids, self.track_bbox, self.track_centroids, self.track_last_frame, self.track_flags):
+                arr[:kept] = arr[:n][keep]
+            self.num_tracks = kept
+        return kept
+
+    def _render_static_overlay(self, h, w):
+        """Draws the lane split and entry/exit lines once into a cached alpha-blended overlay."""
+        overlay = Overlay(h, w)
+        # Draw the lane splitting line
+        overlay.draw(lambda img, c: cv2.line(img, (self.lane_split_x, 0), (self.lane_split_x, h), c, 2), (0, 255, 255))
+        # Draw entry/exit threshold lines
+        overlay.draw(lambda img, c: cv2.line(img, (0, self.entry_y_threshold), (w, self.entry_y_threshold), c, 1), (0, 255, 0)) # Green for entry
+        overlay.draw(lambda img, c: cv2.line(img, (0, self.exit_y_threshold), (w, self.exit_y_threshold), c, 1), (0, 0, 255)) # Red for exit
+        overlay.draw(lambda img, c: cv2.putText(img, 'Entry Line', (10, self.entry_y_threshold - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, c, 1), (0, 255, 0))
+        overlay.draw(lambda img, c: cv2.putText(img, 'Exit Line', (10, self.exit_y_threshold + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, c, 1), (0, 0, 255))
+        self._static_overlay = overlay
+        self._static_shape = (h, w)
 
     def reset_counts(self):
         """Resets the entry and exit counts."""
         self.in_count = 0
         self.out_count = 0
-        self.tracked_objects = {} # Clear all tracked objects on reset
+        self._alloc(16) # Clear all tracked objects on reset
         self.next_id = 0
         self.frame_id = 0
+        # Lane geometry is re-derived from the next frame, which may have a different resolution
+        self.lane_split_x = None
+        self.entry_y_threshold = None
+        self.exit_y_threshold = None
+        self._static_overlay = None
+        self._static_shape = None
 
-    def update(self, detections, frame):
+    def update(self, person_boxes, frame, draw=True, other_boxes=None, other_labels=None):
         """
         Updates the frame with detections, performs tracking, and calculates counts.
         Args:
-            detections (list): A list of tuples, where each tuple contains
-                               (x1, y1, x2, y2, label) for a detected object.
+            person_boxes (numpy.ndarray): An (N, 4) int array of (x1, y1, x2, y2) boxes of detected persons.
             frame (numpy.ndarray): The current video frame.
+            draw (bool): Whether to annotate the frame; tracking and counting happen either way.
+            other_boxes (numpy.ndarray): Optional (K, 4) int array of non-person boxes, drawn in Eagle-Eye mode.
+            other_labels (numpy.ndarray): The (K,) class labels of `other_boxes`.
         Returns:
             tuple: A tuple containing in_count, out_count, net_people_total, and the annotated frame.
         """
@@ -68,104 +196,93 @@ class PeopleTracker:
             if self.exit_y_threshold is None:
                 self.exit_y_threshold = int(h * 0.1) # 10% from top (top of frame)
 
-            # Draw the lane splitting line
-            cv2.line(frame, (self.lane_split_x, 0), (self.lane_split_x, h), (0, 255, 255), 2)
-            # Draw entry/exit threshold lines
-            cv2.line(frame, (0, self.entry_y_threshold), (w, self.entry_y_threshold), (0, 255, 0), 1) # Green for entry
-            cv2.line(frame, (0, self.exit_y_threshold), (w, self.exit_y_threshold), (0, 0, 255), 1) # Red for exit
-            cv2.putText(frame, 'Entry Line', (10, self.entry_y_threshold - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
-            cv2.putText(frame, 'Exit Line', (10, self.exit_y_threshold + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+            # Lane split and entry/exit lines never change, so they are rendered once and blitted
+            if draw:
+                if self._static_overlay is None or self._static_shape != (h, w):
+                    self._render_static_overlay(h, w)
+                self._static_overlay.blit(frame)
 
 
-        current_persons_detections = [d for d in detections if d[4] == 'person']
-        updated_tracked_ids = set()
+        det_centroids = (person_boxes[:, 0:2] + person_boxes[:, 2:4]) // 2
 
         # --- Update existing tracks and add new ones ---
-        for det_x1, det_y1, det_x2, det_y2, label in current_persons_detections:
-            det_bbox = (det_x1, det_y1, det_x2, det_y2)
-            det_centroid = self._get_centroid(det_bbox)
-            
-            matched_id = None
-            min_dist = float('inf')
-
-            # Try to match current detection with existing tracked objects
-            for obj_id, obj_data in self.tracked_objects.items():
-                if obj_data['status'] == 'active': # Only consider active tracks
-                    dist = self._distance_sq(det_centroid, obj_data['centroid'])
-                    if dist < min_dist and dist < self.max_dist_sq:
-                        min_dist = dist
-                        matched_id = obj_id
-            
-            if matched_id is not None:
-                # Update existing track
-                self.tracked_objects[matched_id]['bbox'] = det_bbox
-                self.tracked_objects[matched_id]['centroid'] = det_centroid
-                self.tracked_objects[matched_id]['last_frame_id'] = self.frame_id
-                updated_tracked_ids.add(matched_id)
-            else:
-                # Create a new track
-                self.tracked_objects[self.next_id] = {
-                    'bbox': det_bbox,
-                    'centroid': det_centroid,
-                    'lane': 'unknown', # Will be determined below
-                    'status': 'active',
-                    'counted_in': False,
-                    'counted_out': False,
-                    'last_frame_id': self.frame_id
-                }
-                updated_tracked_ids.add(self.next_id)
-                self.next_id += 1
+        n = self.num_tracks
+        matched = np.zeros(len(person_boxes), bool)
+        if n and len(person_boxes):
+            # Squared distances, computed only for track/detection pairs in neighbouring grid cells
+            cand_rows, cand_cols = self._candidate_pairs(det_centroids)
+            cost = match_costs(self.track_centroids[:n], det_centroids, cand_rows, cand_cols,
+                               self.max_dist, self.max_dist_sq)
+            # Globally optimal one-to-one assignment, solved only over tracks/detections with a candidate
+            reachable = cost < UNMATCHABLE
+            sub_rows = np.flatnonzero(reachable.any(axis=1))
+            sub_cols = np.flatnonzero(reachable.any(axis=0))
+            rows, cols = linear_sum_assignment(cost[np.ix_(sub_rows, sub_cols)])
+            rows, cols = sub_rows[rows], sub_cols[cols]
+            ok = cost[rows, cols] < self.max_dist_sq
+            rows, cols = rows[ok], cols[ok]
+            matched[cols] = True
+            self.track_bbox[rows] = person_boxes[cols]
+            self.track_centroids[rows] = det_centroids[cols]
+            self.track_last_frame[rows] = self.frame_id
+
+        # Create new tracks for unmatched detections
+        new_count = int(np.count_nonzero(~matched))
+        if new_count:
+            self._grow(n + new_count)
+            new = slice(n, n + new_count)
+            self.track_ids[new] = np.arange(self.next_id, self.next_id + new_count)
+            self.track_bbox[new] = person_boxes[~matched]
+            self.track_centroids[new] = det_centroids[~matched]
+            self.track_last_frame[new] = self.frame_id
+            self.track_flags[new] = 0
+            self.num_tracks = n = n + new_count
+            self.next_id += new_count
 
         # --- Remove stale tracks ---
-        stale_ids = [
-            obj_id for obj_id, obj_data in self.tracked_objects.items()
-            if self.frame_id - obj_data['last_frame_id'] > self.stale_frame_threshold
-        ]
-        for obj_id in stale_ids:
-            del self.tracked_objects[obj_id]
+        n = self._compact((self.frame_id - self.track_last_frame[:n]) <= self.stale_frame_threshold)
+
+        # --- Cap memory: evict the least recently seen tracks beyond max_tracks ---
+        overflow = n - self.max_tracks
+        if overflow > 0:
+            keep = np.ones(n, bool)
+            keep[np.argpartition(self.track_last_frame[:n], overflow - 1)[:overflow]] = False
+            n = self._compact(keep)
 
         # --- Counting and Drawing ---
         net_people_total = 0 # Initialize for Eagle-Eye mode
         if self.mode == 'Eagle‑Eye':
-            net_people_total = len(current_persons_detections)
+            net_people_total = len(person_boxes)
             # Draw all detections for Eagle-Eye mode
-            for x1, y1, x2, y2, label in detections:
-                color = (0, 255, 0) if label == 'person' else (255, 0, 0)
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX,
-                            0.5, color, 1)
+            if draw:
+                drawn = [(person_boxes, ('person',) * len(person_boxes), (0, 255, 0))]
+                if other_boxes is not None:
+                    drawn.append((other_boxes, other_labels.tolist(), (255, 0, 0)))
+                for group_boxes, group_labels, color in drawn:
+                    for (x1, y1, x2, y2), label in zip(group_boxes.tolist(), group_labels):
+                        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+                        cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX,
+                                    0.5, color, 1)
         elif self.mode == 'Lane Counter':
-            for obj_id, obj_data in self.tracked_objects.items():
-                x1, y1, x2, y2 = obj_data['bbox']
-                cx, cy = obj_data['centroid']
-
-                # Determine lane for drawing and counting
-                if cx < self.lane_split_x:
-                    obj_data['lane'] = 'enter'
-                    color = (255, 255, 0) # Cyan for enter lane
-                else:
-                    obj_data['lane'] = 'exit'
-                    color = (0, 165, 255) # Orange for exit lane
-
-                # Draw bounding box and ID
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                cv2.putText(frame, f'ID: {obj_id}', (x1, y1 - 20), cv2.FONT_HERSHEY_SIMPLEX,
-                            0.5, color, 1)
-                cv2.putText(frame, obj_data['lane'], (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX,
-                            0.5, color, 1)
-
-                # Entry Logic: Person in enter lane, bottom crosses entry threshold, not yet counted in
-                if obj_data['lane'] == 'enter' and y2 > self.entry_y_threshold and not obj_data['counted_in']:
-                    self.in_count += 1
-                    obj_data['counted_in'] = True
-                    # Optional: Mark as 'finished' or remove if no longer needed to track after counting
-                    # For simplicity, we keep tracking but prevent re-counting
-
-                # Exit Logic: Person in exit lane, top crosses exit threshold, not yet counted out
-                if obj_data['lane'] == 'exit' and y1 < self.exit_y_threshold and not obj_data['counted_out']:
-                    self.out_count += 1
-                    obj_data['counted_out'] = True
-                    # Optional: Mark as 'finished' or remove if no longer needed to track after counting
+            bbox = self.track_bbox[:n]
+            flags = self.track_flags[:n]
+
+            in_delta, out_delta = process_tracks(bbox, self.track_centroids[:n], flags, self.lane_split_x,
+                                                 self.entry_y_threshold, self.exit_y_threshold)
+            self.in_count += in_delta
+            self.out_count += out_delta
+            exit_lane = (flags & LANE_BIT) != 0
+
+            # Draw bounding box and ID
+            if draw:
+                for obj_id, (x1, y1, x2, y2), is_exit in zip(self.track_ids[:n].tolist(), bbox.tolist(), exit_lane.tolist()):
+                    lane = 'exit' if is_exit else 'enter'
+                    color = (0, 165, 255) if is_exit else (255, 255, 0) # Orange for exit lane, cyan for enter lane
+                    cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+                    cv2.putText(frame, f'ID: {obj_id}', (x1, y1 - 20), cv2.FONT_HERSHEY_SIMPLEX,
+                                0.5, color, 1)
+                    cv2.putText(frame, lane, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX,
+                                0.5, color, 1)
 
             net_people_total = self.in_count - self.out_count
 